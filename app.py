@@ -1,20 +1,99 @@
 import streamlit as st
 import google.generativeai as genai
 from PIL import Image
+import bisect
+import concurrent.futures
+import functools
+import hashlib
 import os
 from dotenv import load_dotenv
 import io
 import re
-from PIL import ImageEnhance, ImageFilter
+import threading
+import numpy as np
+from pathlib import Path
 
 # Load environment variables
 load_dotenv()
 
-# Configure Google Generative AI
+# Model names to try, in order of preference
+MODEL_NAMES = (
+    'models/gemini-2.5-flash',      # Latest and fastest
+    'models/gemini-2.5-pro',        # Latest and most capable
+    'models/gemini-2.0-flash-exp',  # Experimental but good
+    'models/gemini-2.0-flash',      # Stable 2.0 version
+    'models/gemini-flash-latest',   # Latest flash model
+    'models/gemini-pro-latest'      # Latest pro model
+)
+
+# Keywords that suggest a sequence diagram (filename and prompt checks),
+# compiled once into a single alternation so each check is one C-level
+# scan instead of one substring search per keyword
+SEQ_FILENAME_RE = re.compile(r'sequence|seq|interaction|collaboration|message flow|uml|system flow|process flow', re.IGNORECASE)
+SEQ_PROMPT_RE = re.compile(r'sequence|lifeline|message|participant|actor|interaction|uml|diagram', re.IGNORECASE)
+
+# Cache model handles so each model is constructed at most once per
+# process; cache_resource is Streamlit's home for exactly this kind of
+# unhashable process-global handle
+@st.cache_resource
+def _get_model(name):
+    return genai.GenerativeModel(name)
+
+# Remember the first model that answered successfully so later calls
+# don't pay failed round-trips for unavailable models again
+_WORKING_MODEL = None
+
+# How many candidate models to race concurrently when no model is known
+# to work yet (hedged requests: first success wins)
+HEDGE_WIDTH = 3
+
+# Give up on a single model attempt after this many seconds so a hung
+# request can't freeze the UI indefinitely
+MODEL_TIMEOUT = 30
+
+# Shared worker pool for Gemini calls: keeps the blocking network waits
+# off the Streamlit script thread and avoids building a fresh pool on
+# every analysis
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+# Predefined prompts offered in the selectbox; frozen at module scope so
+# each rerun hands Streamlit the same tuple instead of a fresh list
+PREDEFINED_PROMPTS = (
+    "Describe this image in detail",
+    "What objects can you identify in this image?",
+    "What is the main subject of this image?",
+    "Analyze the colors and composition of this image",
+    "Is there any text in this image? If so, what does it say?",
+    "What is the mood or atmosphere of this image?",
+    "Are there any people in this image? Describe them.",
+    "What location or setting is depicted in this image?",
+    "Analyze this sequence diagram - show all participants, messages, and interactions",
+    "Extract all text and labels from this diagram",
+    "Explain the flow and logic shown in this technical diagram"
+)
+
+PROMPT_OPTIONS = ("Custom prompt", *PREDEFINED_PROMPTS)
+
+# File types accepted by the uploader, built once instead of on every
+# script rerun
+SUPPORTED_TYPES = [
+    # Common formats
+    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp',
+    # Additional formats
+    'tiff', 'tif', 'svg', 'ico', 'eps', 'psd',
+    # Camera RAW formats
+    'raw', 'cr2', 'nef', 'arw', 'dng',
+    # Apple formats
+    'heic', 'heif'
+]
+
+# Configure Google Generative AI once per process; Streamlit reruns the
+# script on every interaction and the SDK's global state only needs to
+# be set up a single time
+@st.cache_resource
 def configure_genai():
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
-        st.error("Google API Key not found! Please set it in your .env file.")
         return False
     genai.configure(api_key=api_key)
     return True
@@ -24,11 +103,8 @@ def detect_sequence_diagram(image, file_name=None):
     """
     Try to detect if the uploaded image is a sequence diagram
     """
-    file_name_lower = file_name.lower() if file_name else ""
-
     # Check filename for sequence diagram indicators
-    seq_keywords = ['sequence', 'seq', 'interaction', 'collaboration', 'message flow', 'uml', 'system flow', 'process flow']
-    if any(keyword in file_name_lower for keyword in seq_keywords):
+    if SEQ_FILENAME_RE.search(file_name or ""):
         return True, "Filename suggests sequence diagram"
 
     # Check user prompt for sequence diagram indicators
@@ -57,13 +133,25 @@ def analyze_sequence_diagram(image, prompt, file_name=None):
     Perform detailed analysis specifically for sequence diagrams
     """
     try:
-        # Enhance image for better text/line detection
-        enhanced = ImageEnhance.Contrast(image).enhance(2.0)
-        enhanced = ImageEnhance.Sharpness(enhanced).enhance(1.5)
-
         width, height = image.size
+        return _sequence_diagram_analysis(width, height)
 
-        analysis = """## 📋 Sequence Diagram Analysis
+    except Exception as e:
+        st.error(f"Error analyzing sequence diagram: {str(e)}")
+        return None
+
+# Specialized prompt sent to the model for sequence diagrams
+SEQUENCE_DIAGRAM_PROMPT = """This is a UML sequence diagram. Please analyze it in detail and provide:
+1. All participants/actors in the diagram
+2. The sequence of messages between participants
+3. Any conditions, loops, or combined fragments
+4. The overall flow and purpose of the interaction
+5. Any return messages or synchronous/asynchronous calls
+Please be very specific about the text labels and message content."""
+
+# Offline analysis shown when no vision model is available; created once
+# at import instead of per call
+SEQUENCE_DIAGRAM_TEMPLATE = """## 📋 Sequence Diagram Analysis
 
 ### 🔍 **Diagram Overview**
 This appears to be a **UML Sequence Diagram**. Sequence diagrams show object interactions over time, with messages passed between objects.
@@ -111,111 +199,225 @@ For detailed content analysis (specific text and messages), you need a Google AI
    - Participant names (top of each lifeline)
    - Message text (on/near arrows)
    - Conditions and loops (in combined fragments)
-""".format(width=width, height=height)
+"""
 
-        return analysis
+# The analysis text depends only on the dimensions, so memoize it
+@functools.lru_cache(maxsize=32)
+def _sequence_diagram_analysis(width, height):
+    return SEQUENCE_DIAGRAM_TEMPLATE.format(width=width, height=height)
+
+# Longest image side sent to the vision API; Gemini tiles internally,
+# so shipping more pixels than this only wastes upload bytes
+MAX_API_IMAGE_SIDE = 1568
+
+# Size-category boundaries (total pixels) and human-readable mode
+# descriptions for the fallback report, frozen at module scope
+SIZE_THRESHOLDS = (640 * 480, 1920 * 1080, 4 * 1024 * 1024)
+SIZE_LABELS = ("Small", "Medium", "Large", "Very Large")
+
+# Extension groups for the likely-type guess in the fallback report
+PHOTO_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp'})
+VECTOR_EXTS = frozenset({'.svg', '.ico'})
+PRO_EXTS = frozenset({'.tiff', '.tif'})
+
+MODE_DESCRIPTIONS = {
+    'RGB': 'Color image (Red, Green, Blue)',
+    'RGBA': 'Color image with transparency',
+    'L': 'Grayscale (Black and White)',
+    'P': 'Palette-based color',
+    'CMYK': 'CMYK color (for printing)',
+    'HSV': 'HSV color space'
+}
+
+# Classify many images at once: one vectorized pass over all sizes
+# instead of one Python-level classification per image. Used when a
+# caller has a whole batch of (width, height) pairs to report on.
+def classify_batch(sizes):
+    """
+    Classify an array of (width, height) pairs in one vectorized pass.
 
-    except Exception as e:
-        st.error(f"Error analyzing sequence diagram: {str(e)}")
-        return None
+    Returns a list of dicts with aspect_ratio, orientation and
+    size_category per image, matching the single-image classification.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    widths, heights = sizes[:, 0], sizes[:, 1]
+    ratios = np.where(heights > 0, widths / np.maximum(heights, 1), 1.0)
+    orientations = np.where(widths > heights, "Landscape",
+                            np.where(heights > widths, "Portrait", "Square"))
+    categories = np.take(SIZE_LABELS, np.digitize(widths * heights, SIZE_THRESHOLDS, right=False))
+    return [
+        {'aspect_ratio': float(r), 'orientation': str(o), 'size_category': str(c)}
+        for r, o, c in zip(ratios, orientations, categories)
+    ]
 
-# Analyze image using Google Generative AI
-def analyze_image(image, prompt, file_name=None):
-    try:
-        # Check if this is likely a sequence diagram first
-        is_sequence_diagram, reason = detect_sequence_diagram(image, file_name)
+# Template for the no-AI fallback report, parsed once at import and
+# filled in with a single format_map call per analysis
+BASIC_ANALYSIS_TEMPLATE = """## 📊 Detailed Image Analysis
 
-        # Also check prompt for sequence diagram keywords
-        prompt_lower = prompt.lower() if prompt else ""
-        seq_prompt_keywords = ['sequence', 'lifeline', 'message', 'participant', 'actor', 'interaction', 'uml', 'diagram']
-        prompt_suggests_seq = any(keyword in prompt_lower for keyword in seq_prompt_keywords)
+### 📐 **Technical Specifications**
+- **Dimensions**: {width} × {height} pixels ({pixels:,} total pixels)
+- **Aspect Ratio**: {aspect_ratio:.2f}:1
+- **Orientation**: {orientation}
+- **Size Category**: {size_category}
+- **File Format**: {file_format}
+- **Color Mode**: {color_info}
 
-        # If prompt suggests sequence diagram, override detection
-        if prompt_suggests_seq and not is_sequence_diagram:
+### 🎨 **Image Characteristics**
+- **File Type**: {likely_type}
+- **Compression**: {compression} (typical for {image_format})
+- **Bit Depth**: {bit_depth}
+
+### 💡 **Features & Recommendations**
+{rec_block}
+
+### 🔍 **Usage Suggestions**
+- Perfect for: {usage}
+- Best viewed at: {width}×{height} pixels or smaller
+- Aspect ratio: {aspect_note}
+
+### ⚠️ **AI Enhancement Note**
+To get AI-powered content analysis (what's actually *in* the image), your Google API key needs vision capabilities. You can:
+1. Check your API key at [Google AI Studio](https://makersuite.google.com/app/apikey)
+2. Ensure vision/image analysis is enabled
+3. Try a different API key if available
+
+*This analysis provides technical information about your image file. For content-based analysis, please ensure proper API access.*"""
+
+# Raised instead of returning a degraded report when every model fails,
+# so the cached wrapper can refuse to memoize fallback output; carries
+# the already-rendered fallback text (or None) for the caller to show
+class _ModelUnavailable(Exception):
+    def __init__(self, result=None):
+        super().__init__("AI model analysis unavailable")
+        self.result = result
+
+# Analyze image using Google Generative AI
+def analyze_image(image, prompt, file_name=None, upload_bytes=None, raise_when_unavailable=False):
+    global _WORKING_MODEL
+    try:
+        # Keep the original dimensions for the technical report, then cap
+        # the longest side before anything touches the wire
+        orig_width, orig_height = image.size
+        if max(image.size) > MAX_API_IMAGE_SIDE:
+            image = image.copy()
+            image.thumbnail((MAX_API_IMAGE_SIDE, MAX_API_IMAGE_SIDE), Image.Resampling.LANCZOS)
+
+        # Check the prompt first: if it already names a sequence diagram,
+        # the filename/size detection can be skipped entirely
+        if SEQ_PROMPT_RE.search(prompt or ""):
             is_sequence_diagram = True
             reason = "User prompt suggests sequence diagram"
-
-        # Try different model names that might work
-        model_names_to_try = [
-            'models/gemini-2.5-flash',      # Latest and fastest
-            'models/gemini-2.5-pro',        # Latest and most capable
-            'models/gemini-2.0-flash-exp',  # Experimental but good
-            'models/gemini-2.0-flash',      # Stable 2.0 version
-            'models/gemini-flash-latest',   # Latest flash model
-            'models/gemini-pro-latest'      # Latest pro model
-        ]
+        else:
+            is_sequence_diagram, reason = detect_sequence_diagram(image, file_name)
+
+        # Try different model names that might work, starting with the one
+        # that worked last time (if any)
+        model_names_to_try = MODEL_NAMES
+        if _WORKING_MODEL is not None:
+            model_names_to_try = (_WORKING_MODEL,) + tuple(
+                name for name in MODEL_NAMES if name != _WORKING_MODEL
+            )
 
         api_error = None  # Store the last API error for better feedback
 
-        for model_name in model_names_to_try:
-            try:
-                model = genai.GenerativeModel(model_name)
+        # Force the (possibly still lazy) decode on this thread before any
+        # worker touches the image: hedged attempts share the PIL object,
+        # and Pillow's implicit load() is not safe to run concurrently
+        image.load()
+
+        # Encode the image lazily and only once, as the blob dict the SDK
+        # expects for raw bytes (bare bytes fail Blob construction). JPEG
+        # q=90 keeps the payload small and the encode cheap — the API
+        # re-decodes the bytes anyway, so lossless PNG buys nothing here.
+        # The lock keeps concurrent hedged attempts from each encoding.
+        img_blob = None
+        img_blob_lock = threading.Lock()
+
+        def _image_blob():
+            nonlocal img_blob
+            with img_blob_lock:
+                if img_blob is None:
+                    buf = io.BytesIO()
+                    if image.mode in ('RGB', 'L'):
+                        image.save(buf, format='JPEG', quality=90)
+                        mime_type = 'image/jpeg'
+                    else:
+                        image.save(buf, format='PNG', compress_level=1)
+                        mime_type = 'image/png'
+                    img_blob = {'mime_type': mime_type, 'data': buf.getvalue()}
+            return img_blob
+
+        # For sequence diagrams, use specialized prompt if AI vision is available
+        request_prompt = SEQUENCE_DIAGRAM_PROMPT if is_sequence_diagram else prompt
+
+        def _classify_error(model_name, error):
+            # Map an API error to a user-facing message and whether it is
+            # terminal (no point trying other models)
+            error_str = str(error)
+            error_msg = error_str.lower()
+            if "quota" in error_msg or "limit" in error_msg:
+                return f"Google AI API quota exceeded. The free tier limit has been reached. Please:\n1. Wait for quota to reset (usually after some time)\n2. Check your billing at https://ai.dev/usage\n3. Consider upgrading to a paid plan\n\nError: {error_str}", True
+            elif "404" in error_msg or "not found" in error_msg:
+                return f"Model {model_name} not available (404 error).", False
+            elif "permission" in error_msg or "forbidden" in error_msg:
+                return "API key permission denied. Check if your API key has vision capabilities enabled at Google AI Studio.", True
+            else:
+                return f"Error with model {model_name}: {error_str}", False
 
-                # For sequence diagrams, use specialized prompt if AI vision is available
-                if is_sequence_diagram:
-                    specialized_prompt = """This is a UML sequence diagram. Please analyze it in detail and provide:
-1. All participants/actors in the diagram
-2. The sequence of messages between participants
-3. Any conditions, loops, or combined fragments
-4. The overall flow and purpose of the interaction
-5. Any return messages or synchronous/asynchronous calls
-Please be very specific about the text labels and message content."""
-                    response = model.generate_content([specialized_prompt, image])
-                    return response.text
-                else:
-                    # Try passing PIL Image directly first
-                    response = model.generate_content([prompt, image])
-                    return response.text
+        def _call_model(model_name):
+            model = _get_model(model_name)
+            try:
+                # Try passing PIL Image directly first
+                return model.generate_content([request_prompt, image]).text
             except Exception as first_error:
-                # Store specific error messages for better feedback
-                error_msg = str(first_error).lower()
-
-                if "quota" in error_msg or "limit" in error_msg:
-                    api_error = f"Google AI API quota exceeded. The free tier limit has been reached. Please:\n1. Wait for quota to reset (usually after some time)\n2. Check your billing at https://ai.dev/usage\n3. Consider upgrading to a paid plan\n\nError: {str(first_error)}"
-                    break  # No point trying other models if it's a quota issue
-                elif "404" in error_msg or "not found" in error_msg:
-                    api_error = f"Model {model_name} not available. Trying next model..."
-                    # Continue to try next model
-                elif "permission" in error_msg or "forbidden" in error_msg:
-                    api_error = f"API key permission denied. Check if your API key has vision capabilities enabled at Google AI Studio."
-                    break  # No point continuing if it's a permission issue
-                else:
-                    api_error = f"Error with model {model_name}: {str(first_error)}"
-                    # Continue to try next model
+                _, terminal = _classify_error(model_name, first_error)
+                if terminal:
+                    raise
+                # Fallback: convert to bytes (encoded at most once per call)
+                return model.generate_content([request_prompt, _image_blob()]).text
 
-                try:
-                    # Fallback: convert to bytes
-                    img_byte_arr = io.BytesIO()
-                    image.save(img_byte_arr, format='PNG')
-                    img_bytes = img_byte_arr.getvalue()
+        remaining = list(model_names_to_try)
 
-                    if is_sequence_diagram:
-                        specialized_prompt = """This is a UML sequence diagram. Please analyze it in detail and provide:
-1. All participants/actors in the diagram
-2. The sequence of messages between participants
-3. Any conditions, loops, or combined fragments
-4. The overall flow and purpose of the interaction
-5. Any return messages or synchronous/asynchronous calls
-Please be very specific about the text labels and message content."""
-                        response = model.generate_content([specialized_prompt, img_bytes])
-                        return response.text
-                    else:
-                        response = model.generate_content([prompt, img_bytes])
-                        return response.text
-                except Exception as second_error:
-                    error_msg = str(second_error).lower()
-                    if "quota" in error_msg or "limit" in error_msg:
-                        api_error = f"Google AI API quota exceeded. The free tier limit has been reached. Please:\n1. Wait for quota to reset (usually after some time)\n2. Check your billing at https://ai.dev/usage\n3. Consider upgrading to a paid plan\n\nError: {str(second_error)}"
-                        break
-                    elif "404" in error_msg or "not found" in error_msg:
-                        api_error = f"Model {model_name} not available (404 error)."
-                    else:
-                        api_error = f"Error with model {model_name}: {str(second_error)}"
-                    continue
+        # Give the known-good model a solo attempt before burning hedged
+        # requests on the rest of the list
+        if _WORKING_MODEL is not None:
+            try:
+                return _EXECUTOR.submit(_call_model, remaining[0]).result(timeout=MODEL_TIMEOUT)
+            except Exception as error:
+                api_error, terminal = _classify_error(remaining[0], error)
+                remaining = [] if terminal else remaining[1:]
+
+        # Race the remaining candidates in small batches: absent models 404
+        # quickly, so the fastest responder hides the tail latency of the
+        # slow ones. Quota/permission errors stay terminal.
+        for start in range(0, len(remaining), HEDGE_WIDTH):
+            batch = remaining[start:start + HEDGE_WIDTH]
+            futures = {_EXECUTOR.submit(_call_model, name): name for name in batch}
+            hit_terminal = False
+            try:
+                for future in concurrent.futures.as_completed(futures, timeout=MODEL_TIMEOUT):
+                    model_name = futures[future]
+                    try:
+                        text = future.result()
+                    except Exception as error:
+                        message, terminal = _classify_error(model_name, error)
+                        api_error = message
+                        hit_terminal = hit_terminal or terminal
+                        continue
+                    _WORKING_MODEL = model_name
+                    return text
+            except concurrent.futures.TimeoutError:
+                api_error = f"Timed out after {MODEL_TIMEOUT}s waiting for models {', '.join(batch)}."
+            finally:
+                for future in futures:
+                    future.cancel()
+            if hit_terminal:
+                break
 
         # If all models fail, check for sequence diagrams and provide specialized analysis
+        api_error_l = api_error.lower() if api_error else ""
         if is_sequence_diagram:
-            if api_error and ("quota" in api_error.lower() or "limit" in api_error.lower()):
+            if "quota" in api_error_l or "limit" in api_error_l:
                 st.error("🚫 Google AI API Quota Exceeded")
                 st.info("The Google AI API has reached its free tier limit. Please:")
                 st.info("1. **Wait for quota to reset** (usually within minutes/hours)")
@@ -223,17 +425,26 @@ Please be very specific about the text labels and message content."""
                 st.info("3. **Enable billing** if you need more quota")
 
             st.warning(f"AI vision analysis not available. Detected sequence diagram ({reason}). Providing sequence diagram analysis...")
-            return analyze_sequence_diagram(image, prompt, file_name)
+            # Report the dimensions as uploaded, not the API-capped copy;
+            # the header read restores the pre-draft size the same way
+            # the basic analysis below does
+            if upload_bytes is not None:
+                with Image.open(io.BytesIO(upload_bytes)) as header:
+                    orig_width, orig_height = header.size
+            fallback = _sequence_diagram_analysis(orig_width, orig_height)
+            if raise_when_unavailable:
+                raise _ModelUnavailable(fallback)
+            return fallback
         else:
             # Original fallback for non-sequence diagrams
-            if api_error and ("quota" in api_error.lower() or "limit" in api_error.lower()):
+            if "quota" in api_error_l or "limit" in api_error_l:
                 st.error("🚫 Google AI API Quota Exceeded")
                 st.info("The Google AI API has reached its free tier limit. Please:")
                 st.info("1. **Wait for quota to reset** (usually within minutes/hours)")
                 st.info("2. **Check your usage** at [AI Usage Dashboard](https://ai.dev/usage)")
                 st.info("3. **Enable billing** if you need more quota")
                 st.warning("AI image analysis not available. Providing detailed image analysis...")
-            elif api_error and ("permission" in api_error.lower() or "forbidden" in api_error.lower()):
+            elif "permission" in api_error_l or "forbidden" in api_error_l:
                 st.error("🔑 API Key Permission Issue")
                 st.info("Your API key may not have vision capabilities enabled:")
                 st.info("1. Check your key at [Google AI Studio](https://makersuite.google.com/app/apikey)")
@@ -243,8 +454,24 @@ Please be very specific about the text labels and message content."""
             else:
                 st.warning("AI image analysis not available. Providing detailed image analysis...")
 
-        # Enhanced basic analysis
-        width, height = image.size
+        # Enhanced basic analysis. PIL's Image.open is lazy, so reading
+        # size/mode/format/bits from the raw upload parses only the header
+        # without decoding pixels — and reports the file as uploaded,
+        # before any RGB conversion or downscaling
+        if upload_bytes is not None:
+            with Image.open(io.BytesIO(upload_bytes)) as header:
+                # The header also restores the pre-draft dimensions when
+                # the caller let libjpeg decode at reduced scale
+                orig_width, orig_height = header.size
+                mode = header.mode
+                file_format = header.format
+                bit_depth = getattr(header, 'bits', None)
+        else:
+            mode = image.mode
+            file_format = image.format
+            bit_depth = getattr(image, 'bits', None)
+
+        width, height = orig_width, orig_height
         aspect_ratio = width / height if height > 0 else 1
         pixels = width * height
 
@@ -257,47 +484,32 @@ Please be very specific about the text labels and message content."""
             orientation = "Square"
 
         # Determine image mode description
-        mode_descriptions = {
-            'RGB': 'Color image (Red, Green, Blue)',
-            'RGBA': 'Color image with transparency',
-            'L': 'Grayscale (Black and White)',
-            'P': 'Palette-based color',
-            'CMYK': 'CMYK color (for printing)',
-            'HSV': 'HSV color space'
-        }
-
-        color_info = mode_descriptions.get(image.mode, f'Unknown mode: {image.mode}')
+        color_info = MODE_DESCRIPTIONS.get(mode, f'Unknown mode: {mode}')
 
         # Categorize image size
-        if pixels < 640 * 480:
-            size_category = "Small"
-        elif pixels < 1920 * 1080:
-            size_category = "Medium"
-        elif pixels < 4 * 1024 * 1024:
-            size_category = "Large"
-        else:
-            size_category = "Very Large"
+        size_category = SIZE_LABELS[bisect.bisect_right(SIZE_THRESHOLDS, pixels)]
 
-        # Determine if it's likely a photo or graphic
-        file_ext_lower = file_name.lower() if file_name and file_name else ""
-        if file_ext_lower in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
+        # Determine if it's likely a photo or graphic (splitext, not the
+        # full basename — comparing "photo.jpg" to ".jpg" never matched)
+        ext = os.path.splitext(file_name or '')[1].lower()
+        if ext in PHOTO_EXTS:
             likely_type = "Photograph or Digital Image"
-        elif file_ext_lower in ['.svg', '.ico']:
+        elif ext in VECTOR_EXTS:
             likely_type = "Vector Graphic or Icon"
-        elif file_ext_lower in ['.psd']:
+        elif ext == '.psd':
             likely_type = "Photoshop Document"
-        elif file_ext_lower in ['.tiff', '.tif']:
+        elif ext in PRO_EXTS:
             likely_type = "Professional/High-Quality Image"
         else:
             likely_type = "Image File"
 
         # Color mode recommendations
         recommendations = []
-        if image.mode == 'RGBA':
+        if mode == 'RGBA':
             recommendations.append("Has transparent background")
-        elif image.mode == 'L':
+        elif mode == 'L':
             recommendations.append("Black and white image")
-        elif image.mode == 'CMYK':
+        elif mode == 'CMYK':
             recommendations.append("Optimized for printing")
 
         if aspect_ratio > 1.5:
@@ -307,503 +519,99 @@ Please be very specific about the text labels and message content."""
         elif 0.9 <= aspect_ratio <= 1.1:
             recommendations.append("Square format")
 
-        basic_analysis = f"""## 📊 Detailed Image Analysis
-
-### 📐 **Technical Specifications**
-- **Dimensions**: {width} × {height} pixels ({pixels:,} total pixels)
-- **Aspect Ratio**: {aspect_ratio:.2f}:1
-- **Orientation**: {orientation}
-- **Size Category**: {size_category}
-- **File Format**: {image.format or 'Unknown'}
-- **Color Mode**: {color_info}
-
-### 🎨 **Image Characteristics**
-- **File Type**: {likely_type}
-- **Compression**: {'Lossless' if image.format in ['PNG', 'BMP', 'TIFF'] else 'Lossy'} (typical for {image.format})
-- **Bit Depth**: {image.bits if hasattr(image, 'bits') and image.bits else 'Unknown'}
-
-### 💡 **Features & Recommendations**
-"""
-
         if recommendations:
-            for rec in recommendations:
-                basic_analysis += f"- ✅ {rec}\n"
+            rec_block = "\n".join(f"- ✅ {rec}" for rec in recommendations)
         else:
-            basic_analysis += "- Standard image format\n"
-
-        basic_analysis += f"""
-### 🔍 **Usage Suggestions**
-- Perfect for: {'Web display and digital use' if image.format == 'PNG' else 'Photographs and images' if image.format == 'JPEG' else 'High-quality prints' if image.format in ['TIFF', 'BMP'] else 'General use'}
-- Best viewed at: {width}×{height} pixels or smaller
-- Aspect ratio: {'Great for wallpapers/wide displays' if aspect_ratio > 1.5 else 'Great for portraits/mobile' if aspect_ratio < 0.7 else 'Versatile square format'}
-
-### ⚠️ **AI Enhancement Note**
-To get AI-powered content analysis (what's actually *in* the image), your Google API key needs vision capabilities. You can:
-1. Check your API key at [Google AI Studio](https://makersuite.google.com/app/apikey)
-2. Ensure vision/image analysis is enabled
-3. Try a different API key if available
-
-*This analysis provides technical information about your image file. For content-based analysis, please ensure proper API access.*"""
-
-        return basic_analysis
-
+            rec_block = "- Standard image format"
+
+        fallback = BASIC_ANALYSIS_TEMPLATE.format_map({
+            'width': width,
+            'height': height,
+            'pixels': pixels,
+            'aspect_ratio': aspect_ratio,
+            'orientation': orientation,
+            'size_category': size_category,
+            'file_format': file_format or 'Unknown',
+            'color_info': color_info,
+            'likely_type': likely_type,
+            'compression': 'Lossless' if file_format in ['PNG', 'BMP', 'TIFF'] else 'Lossy',
+            'image_format': file_format,
+            'bit_depth': bit_depth if bit_depth else 'Unknown',
+            'rec_block': rec_block,
+            'usage': 'Web display and digital use' if file_format == 'PNG' else 'Photographs and images' if file_format == 'JPEG' else 'High-quality prints' if file_format in ['TIFF', 'BMP'] else 'General use',
+            'aspect_note': 'Great for wallpapers/wide displays' if aspect_ratio > 1.5 else 'Great for portraits/mobile' if aspect_ratio < 0.7 else 'Versatile square format',
+        })
+        if raise_when_unavailable:
+            raise _ModelUnavailable(fallback)
+        return fallback
+
+    except _ModelUnavailable:
+        raise
     except Exception as e:
         st.error(f"Error analyzing image: {str(e)}")
+        if raise_when_unavailable:
+            raise _ModelUnavailable() from e
         return None
 
+# Serve repeated requests from cache: Streamlit reruns the script on
+# every widget interaction, and re-uploading the same screenshot should
+# not redo the whole Gemini round-trip. image_key is a digest of the
+# upload bytes; the PIL image itself is excluded from hashing (_image).
+# Only successful model responses are worth keeping for 24 hours, so the
+# wrapped call raises _ModelUnavailable on the fallback paths — cache_data
+# never stores exceptions, and the models get retried on the next run.
+@st.cache_data(show_spinner=False, ttl=24 * 3600, max_entries=128)
+def _model_analysis_cached(image_key, prompt, file_name, _image, _upload_bytes=None):
+    return analyze_image(_image, prompt, file_name, upload_bytes=_upload_bytes,
+                         raise_when_unavailable=True)
+
+def analyze_image_cached(image_key, prompt, file_name, image, upload_bytes=None):
+    try:
+        return _model_analysis_cached(image_key, prompt, file_name, image, upload_bytes)
+    except _ModelUnavailable as unavailable:
+        return unavailable.result
+
+# Convert an upload to a mode the vision API handles well. RGBA blends
+# onto white in one vectorized pass instead of split() + paste(), which
+# walk the full buffer twice on multi-megapixel uploads.
+def _convert_for_analysis(image):
+    if image.mode == 'RGBA':
+        arr = np.asarray(image, dtype=np.uint8)
+        alpha = arr[..., 3:4].astype(np.float32) * (1 / 255.0)
+        blended = arr[..., :3].astype(np.float32) * alpha + 255.0 * (1 - alpha)
+        return Image.fromarray(blended.astype(np.uint8), 'RGB')
+    if image.mode not in ['RGB', 'L']:
+        return image.convert('RGB')
+    return image
+
+# Dark AI-themed header markup; static, so built once at import
+HEADER_HTML = """
+    <div class="attractive-header">
+        <div class="particles">
+            <div class="particle"></div>
+            <div class="particle"></div>
+            <div class="particle"></div>
+            <div class="particle"></div>
+            <div class="particle"></div>
+        </div>
+        <h1>🤖 AI Image Analyzer</h1>
+        <p>Upload an image and ask questions about it using Google's Generative AI</p>
+        <div style="margin-top: 0.8rem; font-size: 0.8rem; opacity: 0.7; color: rgba(200, 220, 255, 0.8);">
+            ✨ Watch the AI Buffer loading animation when analyzing images!
+        </div>
+    </div>
+    """
+
+# Header CSS lives in assets/header.css; the file is read and wrapped in
+# its <style> tag once per process instead of rebuilding a ~10 KB string
+# on every script rerun
+@st.cache_data
+def _header_css():
+    return f"<style>{(Path(__file__).parent / 'assets' / 'header.css').read_text()}</style>"
+
 # Custom CSS for dark AI-themed animated header
 def load_header_css():
-    st.markdown("""
-    <style>
-        /* Dark AI-themed header with advanced animations */
-        .attractive-header {
-            background: linear-gradient(135deg, #0f0f23 0%, #1a1a2e 30%, #16213e 70%, #0f0f23 100%);
-            padding: 3rem 2rem;
-            border-radius: 20px;
-            margin-bottom: 2rem;
-            box-shadow:
-                0 15px 35px rgba(0, 0, 0, 0.5),
-                inset 0 1px 0 rgba(255, 255, 255, 0.1),
-                0 0 100px rgba(100, 200, 255, 0.2);
-            text-align: center;
-            position: relative;
-            overflow: hidden;
-            border: 0.1px solid rgba(90, 190, 245, 0.08);
-                
-
-        /* Advanced AI neural network background */
-        .attractive-header::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background:
-                radial-gradient(circle at 20% 80%, rgba(0, 150, 255, 0.15) 0%, transparent 40%),
-                radial-gradient(circle at 80% 20%, rgba(255, 0, 150, 0.15) 0%, transparent 40%),
-                radial-gradient(circle at 50% 50%, rgba(0, 255, 200, 0.1) 0%, transparent 60%),
-                linear-gradient(45deg, transparent 30%, rgba(100, 200, 255, 0.05) 50%, transparent 70%);
-            animation: neuralPulse 6s ease-in-out infinite alternate;
-            pointer-events: none;
-        }
-
-        /* Multiple scanning lines effect */
-        .attractive-header::after {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: -100%;
-            width: 100%;
-            height: 3px;
-            background: linear-gradient(90deg,
-                transparent,
-                rgba(0, 255, 255, 0.3),
-                rgba(255, 255, 255, 0.8),
-                rgba(0, 255, 255, 0.3),
-                transparent);
-            animation: scanLines 4s linear infinite;
-            pointer-events: none;
-            box-shadow: 0 0 20px rgba(0, 255, 255, 0.5);
-        }
-
-        /* AI brain icon container */
-        .ai-icon {
-            display: inline-block;
-            font-size: 4rem;
-            margin-bottom: 1rem;
-            animation: iconFloat 3s ease-in-out infinite, iconRotate 8s linear infinite;
-            filter: drop-shadow(0 0 20px rgba(0, 255, 255, 0.8));
-            position: relative;
-            z-index: 2;
-        }
-
-        .attractive-header h1 {
-            color: #ffffff;
-            font-weight: 700;
-            margin: 0;
-            font-size: 3.2rem;
-            text-shadow:
-                0 0 10px rgba(0, 255, 255, 0.8),
-                0 0 20px rgba(0, 255, 255, 0.4),
-                0 0 30px rgba(0, 255, 255, 0.2),
-                0 2px 4px rgba(0, 0, 0, 0.8);
-            position: relative;
-            z-index: 1;
-            animation: fadeInDown 1s ease-out, titleGlow 3s ease-in-out infinite alternate;
-            letter-spacing: 1px;
-        }
-
-        .attractive-header p {
-            color: rgba(200, 220, 255, 0.95);
-            margin: 1rem 0 0 0;
-            font-size: 1.3rem;
-            font-weight: 300;
-            position: relative;
-            z-index: 1;
-            animation: fadeInUp 1s ease-out 0.3s both, subtitlePulse 4s ease-in-out infinite alternate;
-            letter-spacing: 0.5px;
-            text-shadow: 0 0 10px rgba(0, 200, 255, 0.3);
-        }
-
-        /* Floating particles effect */
-        .particles {
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            overflow: hidden;
-            pointer-events: none;
-            z-index: 0;
-        }
-
-        .particle {
-            position: absolute;
-            background: radial-gradient(circle, rgba(0, 255, 255, 0.8) 0%, transparent 70%);
-            border-radius: 50%;
-            animation: floatUp 8s linear infinite;
-        }
-
-        .particle:nth-child(1) { left: 10%; animation-delay: 0s; width: 4px; height: 4px; }
-        .particle:nth-child(2) { left: 30%; animation-delay: 1s; width: 3px; height: 3px; }
-        .particle:nth-child(3) { left: 50%; animation-delay: 2s; width: 5px; height: 5px; }
-        .particle:nth-child(4) { left: 70%; animation-delay: 3s; width: 3px; height: 3px; }
-        .particle:nth-child(5) { left: 90%; animation-delay: 4s; width: 4px; height: 4px; }
-
-        /* Advanced AI-themed animations */
-        @keyframes fadeInDown {
-            from {
-                opacity: 0;
-                transform: translateY(-30px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-
-        @keyframes fadeInUp {
-            from {
-                opacity: 0;
-                transform: translateY(30px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-
-        @keyframes neuralPulse {
-            0% {
-                opacity: 0.2;
-                transform: scale(1) rotate(0deg);
-            }
-            50% {
-                opacity: 0.4;
-            }
-            100% {
-                opacity: 0.2;
-                transform: scale(1.1) rotate(5deg);
-            }
-        }
-
-        @keyframes scanLines {
-            0% {
-                left: -100%;
-                top: 0;
-            }
-            25% {
-                top: 30%;
-            }
-            50% {
-                left: 100%;
-                top: 60%;
-            }
-            75% {
-                top: 90%;
-            }
-            100% {
-                left: -100%;
-                top: 0;
-            }
-        }
-
-        @keyframes titleGlow {
-            0% {
-                filter: brightness(1);
-                transform: scale(1);
-            }
-            100% {
-                filter: brightness(1.2);
-                transform: scale(1.02);
-            }
-        }
-
-        @keyframes subtitlePulse {
-            0% {
-                opacity: 0.8;
-            }
-            100% {
-                opacity: 1;
-            }
-        }
-
-        @keyframes iconFloat {
-            0%, 100% {
-                transform: translateY(0);
-            }
-            50% {
-                transform: translateY(-10px);
-            }
-        }
-
-        @keyframes iconRotate {
-            0% {
-                transform: rotate(0deg);
-            }
-            100% {
-                transform: rotate(360deg);
-            }
-        }
-
-        @keyframes floatUp {
-            0% {
-                bottom: -10px;
-                opacity: 0;
-            }
-            10% {
-                opacity: 1;
-            }
-            90% {
-                opacity: 1;
-            }
-            100% {
-                bottom: 100%;
-                opacity: 0;
-            }
-        }
-
-        /* AI-style button animations */
-        .stButton > button {
-            position: relative;
-            overflow: hidden;
-            transition: all 0.3s ease;
-        }
-
-        .stButton > button::before {
-            content: '';
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            width: 0;
-            height: 0;
-            background: rgba(255, 255, 255, 0.3);
-            border-radius: 50%;
-            transform: translate(-50%, -50%);
-            transition: width 0.6s, height 0.6s;
-        }
-
-        .stButton > button:hover::before {
-            width: 300px;
-            height: 300px;
-        }
-
-        /* Upload area AI effect */
-        .stFileUploader {
-            position: relative;
-        }
-
-        .stFileUploader::after {
-            content: '';
-            position: absolute;
-            top: -2px;
-            left: -2px;
-            right: -2px;
-            bottom: -2px;
-            background: linear-gradient(45deg, #667eea, #764ba2, #f093fb, #667eea);
-            border-radius: 10px;
-            background-size: 400% 400%;
-            animation: gradientShift 3s ease infinite;
-            opacity: 0;
-            z-index: -1;
-            transition: opacity 0.3s ease;
-        }
-
-        .stFileUploader:hover::after {
-            opacity: 0.3;
-        }
-
-        @keyframes gradientShift {
-            0% {
-                background-position: 0% 50%;
-            }
-            50% {
-                background-position: 100% 50%;
-            }
-            100% {
-                background-position: 0% 50%;
-            }
-        }
-
-        /* Enhanced AI Buffer Loading Spinner */
-        .stSpinner > div {
-            border-top-color: #00ffff !important;
-            border-right-color: rgba(0, 255, 255, 0.3) !important;
-            border-bottom-color: #0099ff !important;
-            border-left-color: rgba(0, 255, 255, 0.3) !important;
-            box-shadow:
-                0 0 30px rgba(0, 255, 255, 0.8),
-                inset 0 0 20px rgba(0, 255, 255, 0.4) !important;
-            animation: aiBufferSpin 1s linear infinite, aiBufferPulse 1.5s ease-in-out infinite alternate !important;
-            width: 50px !important;
-            height: 50px !important;
-            border-width: 4px !important;
-        }
-
-        /* AI Buffer Loading Container */
-        .stSpinner {
-            background: rgba(10, 10, 30, 0.9) !important;
-            border: 2px solid rgba(0, 255, 255, 0.3) !important;
-            border-radius: 20px !important;
-            padding: 2rem !important;
-            box-shadow:
-                0 0 50px rgba(0, 255, 255, 0.4),
-                inset 0 0 30px rgba(0, 150, 255, 0.2) !important;
-            position: relative !important;
-            overflow: hidden !important;
-        }
-
-        /* AI Buffer Loading Background Effects */
-        .stSpinner::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background:
-                radial-gradient(circle at 50% 50%, rgba(0, 255, 255, 0.1) 0%, transparent 70%),
-                linear-gradient(45deg, transparent 30%, rgba(0, 255, 255, 0.05) 50%, transparent 70%);
-            animation: bufferBgRotate 4s linear infinite;
-            pointer-events: none;
-        }
-
-        /* AI Buffer Loading Text */
-        .stSpinner p {
-            color: #00ffff !important;
-            text-shadow: 0 0 10px rgba(0, 255, 255, 0.8) !important;
-            font-weight: 600 !important;
-            animation: bufferTextGlow 2s ease-in-out infinite alternate !important;
-        }
-
-        /* AI Buffer Loading Animation Classes */
-        @keyframes aiBufferSpin {
-            0% {
-                transform: rotate(0deg);
-                filter: hue-rotate(0deg);
-            }
-            100% {
-                transform: rotate(360deg);
-                filter: hue-rotate(360deg);
-            }
-        }
-
-        @keyframes aiBufferPulse {
-            0% {
-                opacity: 0.8;
-                transform: scale(1);
-            }
-            100% {
-                opacity: 1;
-                transform: scale(1.1);
-            }
-        }
-
-        @keyframes bufferBgRotate {
-            0% {
-                transform: rotate(0deg);
-            }
-            100% {
-                transform: rotate(360deg);
-            }
-        }
-
-        @keyframes bufferTextGlow {
-            0% {
-                text-shadow: 0 0 10px rgba(0, 255, 255, 0.8);
-                filter: brightness(1);
-            }
-            100% {
-                text-shadow: 0 0 20px rgba(0, 255, 255, 1), 0 0 30px rgba(0, 255, 255, 0.5);
-                filter: brightness(1.3);
-            }
-        }
-
-        /* Sidebar AI glow */
-        .css-1d391kg {
-            border-right: 1px solid rgba(102, 126, 234, 0.1);
-        }
-
-        .css-1d391kg::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            right: 0;
-            width: 1px;
-            height: 100%;
-            background: linear-gradient(180deg, transparent, #667eea, transparent);
-            animation: sideGlow 3s ease-in-out infinite;
-            pointer-events: none;
-        }
-
-        @keyframes sideGlow {
-            0%, 100% {
-                opacity: 0.3;
-                transform: translateY(-100%);
-            }
-            50% {
-                opacity: 0.8;
-                transform: translateY(100%);
-            }
-        }
-
-        /* Success/error messages AI style */
-        .stSuccess {
-            position: relative;
-            overflow: hidden;
-        }
-
-        .stSuccess::before {
-            content: '✓';
-            position: absolute;
-            left: -30px;
-            top: 50%;
-            transform: translateY(-50%);
-            font-size: 20px;
-            color: #48bb78;
-            animation: slideInCheck 0.5s ease-out forwards;
-        }
-
-        @keyframes slideInCheck {
-            to {
-                left: 10px;
-            }
-        }
-
-        /* Simplified - focusing only on enhanced loading spinner */
-
-        /* Responsive design for header */
-        @media (max-width: 768px) {
-            .attractive-header h1 {
-                font-size: 2.2rem;
-            }
-            .attractive-header p {
-                font-size: 1rem;
-            }
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(_header_css(), unsafe_allow_html=True)
 
 # Main application
 def main():
@@ -817,73 +625,39 @@ def main():
     load_header_css()
 
     # Dark AI-themed header with advanced animations
-    st.markdown("""
-    <div class="attractive-header">
-        <div class="particles">
-            <div class="particle"></div>
-            <div class="particle"></div>
-            <div class="particle"></div>
-            <div class="particle"></div>
-            <div class="particle"></div>
-        </div>
-        <h1>🤖 AI Image Analyzer</h1>
-        <p>Upload an image and ask questions about it using Google's Generative AI</p>
-        <div style="margin-top: 0.8rem; font-size: 0.8rem; opacity: 0.7; color: rgba(200, 220, 255, 0.8);">
-            ✨ Watch the AI Buffer loading animation when analyzing images!
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
-    # Configure AI
+    # Configure AI (the error renders here so it shows on every rerun,
+    # not just the first cached call)
     if not configure_genai():
+        st.error("Google API Key not found! Please set it in your .env file.")
         st.stop()
 
     # Sidebar for settings
     st.sidebar.header("Settings")
 
-    # Predefined prompts
-    predefined_prompts = [
-        "Describe this image in detail",
-        "What objects can you identify in this image?",
-        "What is the main subject of this image?",
-        "Analyze the colors and composition of this image",
-        "Is there any text in this image? If so, what does it say?",
-        "What is the mood or atmosphere of this image?",
-        "Are there any people in this image? Describe them.",
-        "What location or setting is depicted in this image?",
-        "Analyze this sequence diagram - show all participants, messages, and interactions",
-        "Extract all text and labels from this diagram",
-        "Explain the flow and logic shown in this technical diagram"
-    ]
-
     # File upload
     st.header("Upload Image")
     uploaded_file = st.file_uploader(
         "Choose an image...",
-        type=[
-            # Common formats
-            'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp',
-            # Additional formats
-            'tiff', 'tif', 'svg', 'ico', 'eps', 'psd',
-            # Camera RAW formats
-            'raw', 'cr2', 'nef', 'arw', 'dng',
-            # Apple formats
-            'heic', 'heif'
-        ]
+        type=SUPPORTED_TYPES
     )
 
     if uploaded_file is not None:
         try:
-            # Display image
-            image = Image.open(uploaded_file)
-
-            # Convert RGBA images to RGB for better compatibility with AI
-            if image.mode == 'RGBA':
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                background.paste(image, mask=image.split()[-1])
-                image = background
-            elif image.mode not in ['RGB', 'L']:
-                image = image.convert('RGB')
+            # Read the upload once: the bytes key the analysis cache, feed
+            # the metadata report, and can be shown to the browser verbatim
+            upload_bytes = uploaded_file.getvalue()
+            image_key = hashlib.blake2b(upload_bytes, digest_size=16).hexdigest()
+            image = Image.open(io.BytesIO(upload_bytes))
+            upload_format = image.format
+            orig_size = image.size
+
+            # Oversized JPEGs get capped to 1568 px before the API call
+            # anyway, so let libjpeg decode at reduced scale directly in
+            # the DCT domain — far cheaper than full decode plus resize
+            if upload_format == 'JPEG' and max(orig_size) > MAX_API_IMAGE_SIDE:
+                image.draft('RGB', (MAX_API_IMAGE_SIDE, MAX_API_IMAGE_SIDE))
 
         except Exception as e:
             st.error(f"Error opening image: {str(e)}")
@@ -894,44 +668,67 @@ def main():
 
         with col1:
             st.subheader("Uploaded Image")
-            st.image(image, use_container_width=True)
-            st.info(f"Image: {uploaded_file.name}")
-            st.info(f"Size: {image.size}")
-            st.info(f"Format: {image.format}")
+            # Browser-displayable uploads go out as the original bytes so
+            # Streamlit skips re-encoding the decoded image to PNG
+            if upload_format in ('JPEG', 'PNG', 'GIF', 'WEBP'):
+                st.image(upload_bytes, use_container_width=True)
+            else:
+                st.image(image, use_container_width=True)
+            # One markdown node instead of three st.info widgets keeps the
+            # per-rerun diff/serialization for this section small
+            st.markdown(
+                f"**Image:** {uploaded_file.name}  \n"
+                f"**Size:** {orig_size}  \n"
+                f"**Format:** {upload_format}"
+            )
 
         with col2:
             st.subheader("Analysis")
 
-            # Prompt selection
-            prompt_option = st.selectbox(
-                "Choose a predefined prompt or enter custom:",
-                ["Custom prompt"] + predefined_prompts
-            )
-
-            if prompt_option == "Custom prompt":
-                custom_prompt = st.text_area(
-                    "Enter your custom prompt:",
-                    placeholder="Ask anything about the image...",
-                    height=100
+            # Batch the prompt widgets behind a form: without it, every
+            # keystroke in the text area and every selectbox change
+            # reruns the whole script (re-reading and re-decoding the
+            # upload). With the form, the script only reruns on submit.
+            with st.form("analyze_form"):
+                # Prompt selection
+                prompt_option = st.selectbox(
+                    "Choose a predefined prompt or enter custom:",
+                    PROMPT_OPTIONS
                 )
-                prompt = custom_prompt if custom_prompt else "Describe this image"
-            else:
-                prompt = prompt_option
-                st.text_area("Selected prompt:", prompt, height=100, disabled=True)
 
-            # Analyze button
-            if st.button("🔍 Analyze Image", type="primary"):
+                if prompt_option == "Custom prompt":
+                    custom_prompt = st.text_area(
+                        "Enter your custom prompt:",
+                        placeholder="Ask anything about the image...",
+                        height=100
+                    )
+                    prompt = custom_prompt if custom_prompt else "Describe this image"
+                else:
+                    prompt = prompt_option
+                    st.text_area("Selected prompt:", prompt, height=100, disabled=True)
+
+                # Analyze button
+                submitted = st.form_submit_button("🔍 Analyze Image", type="primary")
+
+            if submitted:
                 with st.spinner("Analyzing image..."):
-                    result = analyze_image(image, prompt, uploaded_file.name)
+                    # Convert to RGB only now: everything above needs just
+                    # the header (size/format) or the raw bytes, so the
+                    # full decode is deferred until an analysis is
+                    # actually requested
+                    image = _convert_for_analysis(image)
+                    result = analyze_image_cached(image_key, prompt, uploaded_file.name, image, upload_bytes)
 
                     if result:
                         st.subheader("Analysis Result")
                         st.write(result)
 
-                        # Download result
+                        # Download result; the callable defers encoding
+                        # and serialization of the payload until the
+                        # button is actually clicked
                         st.download_button(
                             label="📥 Download Analysis",
-                            data=result,
+                            data=lambda: result.encode("utf-8"),
                             file_name=f"image_analysis_{uploaded_file.name}.txt",
                             mime="text/plain"
                         )
@@ -2,13 +2,15 @@ import os
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from model_cache import cached_list_models
+
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 genai.configure(api_key=api_key)
 
 print("Available models:")
 try:
-    models = genai.list_models()
+    models = cached_list_models()
     for model in models:
         print(f"- {model.name}: {model.display_name}")
         print(f"  Supported generation methods: {model.supported_generation_methods}")
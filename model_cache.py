@@ -0,0 +1,45 @@
+"""
+Disk cache for genai.list_models() shared by the helper scripts.
+
+The model listing is a network round-trip that dominates script wall
+time; cache it under ~/.cache/image-analysis so repeated runs skip the
+call entirely until the cache goes stale.
+"""
+
+import json
+import os
+import time
+from collections import namedtuple
+
+import google.generativeai as genai
+
+CACHE_PATH = os.path.expanduser("~/.cache/image-analysis/models.json")
+
+ModelInfo = namedtuple("ModelInfo", ["name", "display_name", "supported_generation_methods"])
+
+
+def cached_list_models(ttl=3600):
+    """
+    Return the available models as ModelInfo tuples, serving from the
+    disk cache when it is younger than ttl seconds.
+    """
+    try:
+        if time.time() - os.path.getmtime(CACHE_PATH) < ttl:
+            with open(CACHE_PATH) as f:
+                return [ModelInfo(*entry) for entry in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        pass  # Missing or corrupt cache: fall through to the API
+
+    models = [
+        ModelInfo(m.name, m.display_name, list(m.supported_generation_methods))
+        for m in genai.list_models()
+    ]
+
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH, "w") as f:
+            json.dump([list(m) for m in models], f)
+    except OSError:
+        pass  # Cache write failures shouldn't break the scripts
+
+    return models
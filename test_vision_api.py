@@ -2,6 +2,8 @@ import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 
+from model_cache import cached_list_models
+
 # Load environment variables
 load_dotenv()
 
@@ -15,23 +17,27 @@ if api_key:
         genai.configure(api_key=api_key)
         print("API configured successfully")
 
-        # List available models
+        # List available models (served from the shared disk cache when fresh)
+        models = cached_list_models()
         print("\nAvailable models:")
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                print(f"  - {m.name}")
-
-        # Test with vision-capable model
+        generate_capable = {
+            m.name.rsplit('/', 1)[-1]: m.name
+            for m in models
+            if 'generateContent' in m.supported_generation_methods
+        }
+        for name in generate_capable.values():
+            print(f"  - {name}")
+
+        # Test with vision-capable model: pick the first preferred model
+        # the listing says supports generateContent instead of probing a
+        # hardcoded list with one failed round-trip per absent model
         print("\nTesting vision capabilities...")
-        model_names = [
-            'gemini-1.5-flash',
-            'gemini-1.5-pro',
-            'models/gemini-1.5-flash',
-            'models/gemini-1.5-pro',
-            'gemini-2.0-flash-exp'
-        ]
-
-        for model_name in model_names:
+        preferred = ('gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-2.0-flash-exp')
+        model_name = next((generate_capable[p] for p in preferred if p in generate_capable), None)
+
+        if model_name is None:
+            print("No preferred model supports generateContent")
+        else:
             try:
                 print(f"\nTrying model: {model_name}")
                 model = genai.GenerativeModel(model_name)
@@ -39,7 +45,6 @@ if api_key:
                 # Test with text first
                 response = model.generate_content("Hello, this is a test.")
                 print(f"SUCCESS {model_name}: {response.text[:100]}...")
-                break
 
             except Exception as e:
                 print(f"FAILED {model_name}: {str(e)}")